@@ -1,17 +1,21 @@
 import os
 import sys
+import torch
 import numpy as np
 
 from typing import Literal, Generator
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from PIL.Image import Image
 from transformers import LayoutLMv3ForTokenClassification
 from doclayout_yolo import YOLOv10
 from paddleocr import PaddleOCR
 
 from .layoutreader import prepare_inputs, boxes2inputs, parse_logits
+from .onnx_layoutreader import ONNXLayoutReader, export_int8_onnx
 from .raw_optimizer import RawOptimizer
-from .rectangle import intersection_area, Rectangle
+from .rectangle import intersection_area, max_overlap_indexes_aabb, bounding_boxes, Rectangle
 from .types import ExtractedResult, OCRFragment, LayoutClass, Layout
 from .downloader import download
 from .utils import ensure_dir
@@ -20,17 +24,31 @@ from .utils import ensure_dir
 # https://github.com/PaddlePaddle/PaddleOCR/blob/2c0c4beb0606819735a16083cdebf652939c781a/paddleocr.py#L108-L157
 type PaddleLang = Literal["ch", "en", "korean", "japan", "chinese_cht", "ta", "te", "ka", "latin", "arabic", "cyrillic", "devanagari"]
 
+_LAYOUT_CLASSES: dict[int, LayoutClass] = {c.value: c for c in LayoutClass}
+_MAX_CACHED_OCRS = 3
+_LAYOUT_BATCH_SIZE = 8
+
+# PaddleOCR's default. torch models and background loaders share the CPU with MKLDNN,
+# so OCR does not take every core even on large hosts
+_OCR_CPU_THREADS = min(os.cpu_count() or 10, 10)
+
 class DocExtractor:
   def __init__(
       self,
       model_dir_path: str,
       device: Literal["cpu", "cuda"] = "cpu",
+      use_onnx_int8: bool = False,
+      polygon_matching: bool = False,
     ):
     self._model_dir_path: str = model_dir_path
     self._device: Literal["cpu", "cuda"] = device
-    self._ocr_and_lan: tuple[PaddleOCR, PaddleLang] | None = None
+    self._use_onnx_int8: bool = use_onnx_int8
+    self._polygon_matching: bool = polygon_matching
+    self._ocrs: OrderedDict[PaddleLang, PaddleOCR] = OrderedDict()
     self._yolo: YOLOv10 | None = None
-    self._layout: LayoutLMv3ForTokenClassification | None = None
+    self._layout: LayoutLMv3ForTokenClassification | ONNXLayoutReader | None = None
+    self._yolo_future: Future[YOLOv10] | None = None
+    self._layout_future: Future[LayoutLMv3ForTokenClassification | ONNXLayoutReader] | None = None
 
   def extract(
       self,
@@ -38,29 +56,86 @@ class DocExtractor:
       lang: PaddleLang,
       adjust_points: bool = False,
     ) -> ExtractedResult:
+    return self.extract_batch([image], lang, adjust_points)[0]
 
-    raw_optimizer = RawOptimizer(image, adjust_points)
-    fragments = list(self._search_orc_fragments(raw_optimizer.image_np, lang))
-    raw_optimizer.receive_raw_fragments(fragments)
-
-    width, height = raw_optimizer.image.size
-    self._order_fragments(width, height, fragments)
-    layouts = self._get_layouts(raw_optimizer.image)
-    layouts = self._layouts_matched_by_fragments(fragments, layouts)
-    raw_optimizer.receive_raw_layouts(layouts)
-
-    return ExtractedResult(
-      rotation=raw_optimizer.rotation,
-      layouts=layouts,
-      extracted_image=image,
-      adjusted_image=raw_optimizer.adjusted_image,
-    )
+  def extract_batch(
+      self,
+      images: list[Image],
+      lang: PaddleLang,
+      adjust_points: bool = False,
+    ) -> list[ExtractedResult]:
+
+    if len(images) == 0:
+      return []
+
+    self._preload_models()
+    results: list[ExtractedResult] = []
+
+    # pages go through in chunks, so a YOLO batch and the rotated images kept alive stay bounded
+    for i in range(0, len(images), _LAYOUT_BATCH_SIZE):
+      results.extend(self._extract_chunk(
+        images=images[i:i + _LAYOUT_BATCH_SIZE],
+        lang=lang,
+        adjust_points=adjust_points,
+      ))
+    return results
+
+  def _extract_chunk(
+      self,
+      images: list[Image],
+      lang: PaddleLang,
+      adjust_points: bool,
+    ) -> list[ExtractedResult]:
+
+    raw_optimizers: list[RawOptimizer] = []
+    fragments_list: list[list[OCRFragment]] = []
+    rects_list: list[list[Rectangle]] = []
+    boxes_list: list[np.ndarray] = []
+
+    for image in images:
+      raw_optimizer = RawOptimizer(image, adjust_points)
+      fragments = list(self._search_orc_fragments(image, lang))
+      raw_optimizer.receive_raw_fragments(fragments)
+
+      # fragments in coordinates of the rotated image, which YOLO layouts share
+      rects = raw_optimizer.image_rectangles(fragments)
+      boxes = bounding_boxes(rects)
+      width, height = raw_optimizer.image.size
+      self._order_fragments(width, height, boxes, fragments)
+
+      raw_optimizers.append(raw_optimizer)
+      fragments_list.append(fragments)
+      rects_list.append(rects)
+      boxes_list.append(boxes)
+
+    # layouts of all pages in the chunk are detected by YOLO in one batched forward
+    layouts_list = self._get_layouts([o.image for o in raw_optimizers])
+    results: list[ExtractedResult] = []
+
+    for i, image in enumerate(images):
+      raw_optimizer = raw_optimizers[i]
+      layouts = self._layouts_matched_by_fragments(
+        fragments=fragments_list[i],
+        fragment_rects=rects_list[i],
+        fragment_boxes=boxes_list[i],
+        layouts=layouts_list[i],
+      )
+      raw_optimizer.receive_raw_layouts(layouts)
+      results.append(ExtractedResult(
+        rotation=raw_optimizer.rotation,
+        layouts=layouts,
+        extracted_image=image,
+        adjusted_image=raw_optimizer.adjusted_image,
+      ))
+
+    return results
 
   # https://paddlepaddle.github.io/PaddleOCR/latest/quick_start.html#_2
-  def _search_orc_fragments(self, image: np.ndarray, lang: PaddleLang) -> Generator[OCRFragment, None, None]:
+  def _search_orc_fragments(self, image: Image, lang: PaddleLang) -> Generator[OCRFragment, None, None]:
     # about img parameter to see
     # https://github.com/PaddlePaddle/PaddleOCR/blob/2c0c4beb0606819735a16083cdebf652939c781a/paddleocr.py#L582-L619
-    for item in self._get_ocr(lang).ocr(img=image, cls=True):
+    # img must be ndarray, path or bytes, so the PIL image is converted only at this call
+    for item in self._get_ocr(lang).ocr(img=np.asarray(image), cls=True):
       for line in item:
         react: list[list[float]] = line[0]
         text, rank = line[1]
@@ -76,9 +151,8 @@ class DocExtractor:
           ),
         )
 
-  def _order_fragments(self, width: int, height: int, fragments: list[OCRFragment]):
+  def _order_fragments(self, width: int, height: int, boxes: np.ndarray, fragments: list[OCRFragment]):
     layout_model = self._get_layout()
-    boxes: list[list[int]] = []
     steps: float = 1000.0 # max value of layoutreader
     x_rate: float = 1.0
     y_rate: float = 1.0
@@ -91,42 +165,46 @@ class DocExtractor:
       x_rate = width / height
       x_offset = (1.0 - x_rate) / 2.0
 
-    for left, top, right, bottom in self._collect_rate_boxes(fragments):
-      boxes.append([
-        round((left * x_rate + x_offset) * steps),
-        round((top * y_rate + y_offset) * steps),
-        round((right * x_rate + x_offset) * steps),
-        round((bottom * y_rate + y_offset) * steps),
-      ])
-    inputs = boxes2inputs(boxes)
+    # np.rint rounds half to even like round(), so the boxes are the same as a per-value loop
+    rate_boxes = self._collect_rate_boxes(boxes)
+    rate_boxes = rate_boxes * (x_rate, y_rate, x_rate, y_rate) + (x_offset, y_offset, x_offset, y_offset)
+    input_boxes: list[list[int]] = np.rint(rate_boxes * steps).astype(np.int64).tolist()
+    inputs = boxes2inputs(input_boxes)
     inputs = prepare_inputs(inputs, layout_model)
-    logits = layout_model(**inputs).logits.cpu().squeeze(0)
-    orders: list[int] = parse_logits(logits, len(boxes))
+    with torch.inference_mode():
+      logits = layout_model(**inputs).logits
+    # parse_logits reads single elements many times, so copy to host once instead of syncing per read
+    logits = logits.squeeze(0).cpu()
+    orders: list[int] = parse_logits(logits, len(input_boxes))
 
     for order, fragment in zip(orders, fragments):
       fragment.order = order
 
-  def _get_layouts(self, source: Image) -> list[Layout]:
+  def _get_layouts(self, sources: list[Image]) -> list[list[Layout]]:
+    if len(sources) == 0:
+      return []
+
     # about source parameter to see:
     # https://github.com/opendatalab/DocLayout-YOLO/blob/7c4be36bc61f11b67cf4a44ee47f3c41e9800a91/doclayout_yolo/data/build.py#L157-L175
-    det_res = self._get_yolo().predict(
-      source=source,
-      imgsz=1024,
-      conf=0.2,
-      device=self._device    # Device to use (e.g., "cuda:0" or "cpu")
-    )
-    boxes = det_res[0].__dict__["boxes"]
-    layouts: list[Layout] = []
+    with torch.inference_mode():
+      det_res = self._get_yolo().predict(
+        source=sources,
+        imgsz=1024,
+        conf=0.2,
+        device=self._device,   # Device to use (e.g., "cuda:0" or "cpu")
+        half=self._device.startswith("cuda"),
+        verbose=False,
+      )
+    return [self._parse_layouts(res.__dict__["boxes"]) for res in det_res]
 
-    for cls_id, rect in zip(boxes.cls, boxes.xyxy):
-      cls_id = cls_id.item()
-      cls=LayoutClass(round(cls_id))
+  def _parse_layouts(self, boxes) -> list[Layout]:
+    # transfer all detections to host at once instead of calling .item() per scalar
+    cls_ids = np.rint(boxes.cls.detach().cpu().numpy()).astype(np.int64).tolist()
+    rects = boxes.xyxy.detach().cpu().numpy().tolist()
+    layouts: list[Layout] = []
 
-      x1, y1, x2, y2 = rect
-      x1 = x1.item()
-      y1 = y1.item()
-      x2 = x2.item()
-      y2 = y2.item()
+    for cls_id, (x1, y1, x2, y2) in zip(cls_ids, rects):
+      cls = _LAYOUT_CLASSES[cls_id]
       rect = Rectangle(
         lt=(x1, y1),
         rt=(x2, y1),
@@ -137,16 +215,37 @@ class DocExtractor:
 
     return layouts
 
-  def _layouts_matched_by_fragments(self, fragments: list[OCRFragment], layouts: list[Layout]):
-    for fragment in fragments:
-      max_area: float = 0.0
-      max_layout_index: int = 0
-      for i, layout in enumerate(layouts):
-        area = intersection_area(fragment.rect, layout.rect)
-        if area > max_area:
-          max_area = area
-          max_layout_index = i
-      layouts[max_layout_index].fragments.append(fragment)
+  # fragment_rects and fragment_boxes must be in the same coordinates as layouts
+  def _layouts_matched_by_fragments(
+      self,
+      fragments: list[OCRFragment],
+      fragment_rects: list[Rectangle],
+      fragment_boxes: np.ndarray,
+      layouts: list[Layout],
+    ):
+    if len(layouts) == 1:
+      # argmax over a single column is always 0, no overlap needs to be computed
+      layouts[0].fragments.extend(fragments)
+
+    elif len(fragments) > 0 and len(layouts) > 0:
+      # index of the layout with the largest overlap for each fragment
+      layout_indexes: np.ndarray
+      if self._polygon_matching:
+        areas = np.array([
+          [intersection_area(rect, l.rect) for l in layouts]
+          for rect in fragment_rects
+        ])
+        layout_indexes = areas.argmax(axis=1)
+      else:
+        # YOLO layouts are axis-aligned in the rotated frame and fragments are nearly so,
+        # which is why bounding boxes are accurate enough to be the default
+        layout_indexes = max_overlap_indexes_aabb(
+          fragment_boxes,
+          bounding_boxes(l.rect for l in layouts),
+        )
+
+      for fragment, layout_index in zip(fragments, layout_indexes.tolist()):
+        layouts[layout_index].fragments.append(fragment)
 
     for layout in layouts:
       layout.fragments.sort(key=lambda x: x.order)
@@ -163,15 +262,23 @@ class DocExtractor:
       return fragments[0].order
 
   def _get_ocr(self, lang: PaddleLang) -> PaddleOCR:
-    if self._ocr_and_lan is not None:
-      ocr, origin_lang = self._ocr_and_lan
-      if lang == origin_lang:
-        return ocr
+    ocr = self._ocrs.get(lang, None)
+    if ocr is not None:
+      self._ocrs.move_to_end(lang)
+      return ocr
 
+    use_gpu = self._device.startswith("cuda")
+    use_tensorrt = use_gpu and _is_tensorrt_available()
     ocr = PaddleOCR(
       lang=lang,
       use_angle_cls=True,
-      use_gpu=self._device.startswith("cuda"),
+      use_gpu=use_gpu,
+      enable_mkldnn=not use_gpu,
+      cpu_threads=_OCR_CPU_THREADS,
+      use_tensorrt=use_tensorrt,
+      precision="fp16" if use_tensorrt else "fp32",
+      det_limit_side_len=960,
+      rec_batch_num=16,
       det_model_dir=ensure_dir(
         os.path.join(self._model_dir_path, "paddle", "det"),
       ),
@@ -182,66 +289,99 @@ class DocExtractor:
         os.path.join(self._model_dir_path, "paddle", "cls"),
       ),
     )
-    self._ocr_and_lan = (ocr, lang)
+    self._ocrs[lang] = ocr
+
+    # evict the least recently used language to bound memory of loaded models
+    while len(self._ocrs) > _MAX_CACHED_OCRS:
+      self._ocrs.popitem(last=False)
+
     return ocr
 
+  # layoutreader and YOLO are only needed after OCR, so they are loaded in
+  # background threads while PaddleOCR loads and runs on the calling thread
+  def _preload_models(self):
+    load_layout = self._layout is None and self._layout_future is None
+    load_yolo = self._yolo is None and self._yolo_future is None
+    if not load_layout and not load_yolo:
+      return
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    if load_layout:
+      self._layout_future = executor.submit(self._create_layout)
+    if load_yolo:
+      self._yolo_future = executor.submit(self._create_yolo)
+    executor.shutdown(wait=False)
+
   def _get_yolo(self) -> YOLOv10:
+    if self._yolo_future is not None:
+      future = self._yolo_future
+      self._yolo_future = None
+      # waits for the background load and raises its error here instead of loading again
+      self._yolo = future.result()
     if self._yolo is None:
-      yolo_model_url = "https://huggingface.co/opendatalab/PDF-Extract-Kit-1.0/resolve/main/models/Layout/YOLO/doclayout_yolo_ft.pt"
-      yolo_model_name = "doclayout_yolo_ft.pt"
-      yolo_model_path = Path(os.path.join(self._model_dir_path, yolo_model_name))
-      if not yolo_model_path.exists():
-        download(yolo_model_url, yolo_model_path)
-      self._yolo = YOLOv10(str(yolo_model_path))
+      self._yolo = self._create_yolo()
     return self._yolo
 
-  def _get_layout(self) -> LayoutLMv3ForTokenClassification:
+  def _create_yolo(self) -> YOLOv10:
+    yolo_model_url = "https://huggingface.co/opendatalab/PDF-Extract-Kit-1.0/resolve/main/models/Layout/YOLO/doclayout_yolo_ft.pt"
+    yolo_model_name = "doclayout_yolo_ft.pt"
+    yolo_model_path = Path(os.path.join(self._model_dir_path, yolo_model_name))
+    if not yolo_model_path.exists():
+      download(yolo_model_url, yolo_model_path)
+    yolo = YOLOv10(str(yolo_model_path))
+    yolo.to(self._device)
+    return yolo
+
+  def _get_layout(self) -> LayoutLMv3ForTokenClassification | ONNXLayoutReader:
+    if self._layout_future is not None:
+      future = self._layout_future
+      self._layout_future = None
+      # waits for the background load and raises its error here instead of loading again
+      self._layout = future.result()
     if self._layout is None:
-      cache_dir = ensure_dir(
-        os.path.join(self._model_dir_path, "layoutreader"),
-      )
-      self._layout = LayoutLMv3ForTokenClassification.from_pretrained(
-        pretrained_model_name_or_path="hantian/layoutreader",
-        cache_dir=cache_dir,
-        local_files_only=os.path.exists(os.path.join(cache_dir, "models--hantian--layoutreader")),
-      )
+      self._layout = self._create_layout()
     return self._layout
 
-  def _collect_rate_boxes(self, fragments: list[OCRFragment]):
-    boxes = self._get_boxes(fragments)
-    left = float("inf")
-    top = float("inf")
-    right = float("-inf")
-    bottom = float("-inf")
+  def _create_layout(self) -> LayoutLMv3ForTokenClassification | ONNXLayoutReader:
+    # INT8 ONNX model only runs on CPU, CUDA keeps the torch model
+    if self._use_onnx_int8 and not self._device.startswith("cuda"):
+      return self._get_onnx_int8_layout()
+    else:
+      return self._load_layout().to(self._device).eval()
 
-    for _left, _top, _right, _bottom in boxes:
-      left = min(left, _left)
-      top = min(top, _top)
-      right = max(right, _right)
-      bottom = max(bottom, _bottom)
+  def _get_onnx_int8_layout(self) -> ONNXLayoutReader:
+    model_path = os.path.join(
+      ensure_dir(os.path.join(self._model_dir_path, "layoutreader_onnx_int8")),
+      "model_quantized.onnx",
+    )
+    if not os.path.exists(model_path):
+      export_int8_onnx(self._load_layout(), model_path)
+    return ONNXLayoutReader(model_path)
 
+  def _load_layout(self) -> LayoutLMv3ForTokenClassification:
+    cache_dir = ensure_dir(
+      os.path.join(self._model_dir_path, "layoutreader"),
+    )
+    return LayoutLMv3ForTokenClassification.from_pretrained(
+      pretrained_model_name_or_path="hantian/layoutreader",
+      cache_dir=cache_dir,
+      local_files_only=os.path.exists(os.path.join(cache_dir, "models--hantian--layoutreader")),
+    )
+
+  def _collect_rate_boxes(self, boxes: np.ndarray) -> np.ndarray:
+    if len(boxes) == 0:
+      return boxes
+
+    left, top = boxes[:, :2].min(axis=0)
+    right, bottom = boxes[:, 2:].max(axis=0)
     width = right - left
     height = bottom - top
 
-    for _left, _top, _right, _bottom in boxes:
-      yield (
-        (_left - left) / width,
-        (_top - top) / height,
-        (_right - left) / width,
-        (_bottom - top) / height,
-      )
+    return (boxes - (left, top, left, top)) / (width, height, width, height)
 
-  def _get_boxes(self, fragments: list[OCRFragment]):
-    boxes: list[tuple[float, float, float, float]] = []
-    for fragment in fragments:
-      left: float = float("inf")
-      top: float = float("inf")
-      right: float = float("-inf")
-      bottom: float = float("-inf")
-      for x, y in fragment.rect:
-        left = min(left, x)
-        top = min(top, y)
-        right = max(right, x)
-        bottom = max(bottom, y)
-      boxes.append((left, top, right, bottom))
-    return boxes
\ No newline at end of file
+def _is_tensorrt_available() -> bool:
+  try:
+    from paddle.inference import get_trt_compile_version
+    return any(v > 0 for v in get_trt_compile_version())
+  except (ImportError, AttributeError):
+    return False
@@ -0,0 +1,69 @@
+import os
+import torch
+import tempfile
+
+from torch import nn
+from transformers import LayoutLMv3ForTokenClassification
+from transformers.modeling_outputs import TokenClassifierOutput
+from .layoutreader import boxes2inputs
+
+
+# layoutreader has no visual embedding, so only these inputs exist in the exported graph.
+_INPUT_NAMES = ("input_ids", "bbox", "attention_mask")
+
+class ONNXLayoutReader:
+  def __init__(self, model_path: str):
+    # onnxruntime is an optional dependency, it is only imported when the INT8 model is used
+    from onnxruntime import InferenceSession
+    self._session = InferenceSession(model_path, providers=["CPUExecutionProvider"])
+
+  # same attributes prepare_inputs reads from LayoutLMv3ForTokenClassification
+  @property
+  def device(self) -> torch.device:
+    return torch.device("cpu")
+
+  @property
+  def dtype(self) -> torch.dtype:
+    return torch.float32
+
+  def __call__(self, **inputs: torch.Tensor) -> TokenClassifierOutput:
+    logits, = self._session.run(
+      output_names=["logits"],
+      input_feed={name: inputs[name].cpu().numpy() for name in _INPUT_NAMES},
+    )
+    return TokenClassifierOutput(logits=torch.from_numpy(logits))
+
+def export_int8_onnx(model: LayoutLMv3ForTokenClassification, model_path: str):
+  # onnxruntime is an optional dependency, it is only imported when the INT8 model is used
+  from onnxruntime.quantization import quantize_dynamic, QuantType
+
+  inputs = boxes2inputs([[0, 0, 0, 0], [0, 0, 0, 0]])
+  dynamic_axes = {
+    name: {0: "batch", 1: "sequence"}
+    for name in (*_INPUT_NAMES, "logits")
+  }
+  with tempfile.TemporaryDirectory() as temp_dir:
+    fp32_model_path = os.path.join(temp_dir, "model.onnx")
+    torch.onnx.export(
+      _LogitsOnly(model.cpu()).eval(),
+      args=tuple(inputs[name] for name in _INPUT_NAMES),
+      f=fp32_model_path,
+      input_names=list(_INPUT_NAMES),
+      output_names=["logits"],
+      dynamic_axes=dynamic_axes,
+      opset_version=14,
+      dynamo=False,
+    )
+    quantize_dynamic(
+      model_input=fp32_model_path,
+      model_output=model_path,
+      weight_type=QuantType.QInt8,
+    )
+
+class _LogitsOnly(nn.Module):
+  def __init__(self, model: LayoutLMv3ForTokenClassification):
+    super().__init__()
+    self._model = model
+
+  def forward(self, input_ids: torch.Tensor, bbox: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    return self._model(input_ids=input_ids, bbox=bbox, attention_mask=attention_mask).logits
@@ -1,6 +1,3 @@
-import numpy as np
-
-from dataclasses import dataclass
 from PIL.Image import Image
 from math import pi
 from .types import OCRFragment, Layout
@@ -11,12 +8,6 @@ from .rectangle import Rectangle
 _TINY_ROTATION = 0.005 # below this angle, we consider the text is horizontal
 
 
-@dataclass
-class _RotationContext:
-  to_origin: RotationAdjuster
-  to_new: RotationAdjuster
-  fragment_origin_rectangles: list[Rectangle]
-
 class RawOptimizer:
   def __init__(
       self,
@@ -26,9 +17,9 @@ class RawOptimizer:
     self._raw: Image = raw
     self._image: Image = raw
     self._adjust_points: bool = adjust_points
-    self._fragments: list[OCRFragment]
     self._rotation: float = 0.0
-    self._rotation_context: _RotationContext | None  = None
+    self._to_new: RotationAdjuster | None = None
+    self._to_origin: RotationAdjuster | None = None
 
   @property
   def image(self) -> Image:
@@ -43,12 +34,7 @@ class RawOptimizer:
   def rotation(self) -> float:
     return self._rotation
 
-  @property
-  def image_np(self) -> np.ndarray:
-    return np.array(self._raw)
-
   def receive_raw_fragments(self, fragments: list[OCRFragment]):
-    self._fragments = fragments
     self._rotation = calculate_rotation(fragments)
 
     if abs(self._rotation) < _TINY_ROTATION:
@@ -60,45 +46,43 @@ class RawOptimizer:
       fillcolor=(255, 255, 255),
       expand=True,
     )
-    self._rotation_context = _RotationContext(
-      fragment_origin_rectangles=[f.rect for f in fragments],
-      to_origin=RotationAdjuster(
+
+    self._to_new = RotationAdjuster(
+      origin_size=origin_size,
+      new_size=self._image.size,
+      rotation=self._rotation,
+      to_origin_coordinate=False,
+    )
+
+    # fragments stay in origin coordinates unless points are adjusted,
+    # so only layouts detected on the rotated image are moved back later
+    if not self._adjust_points:
+      self._to_origin = RotationAdjuster(
         origin_size=origin_size,
         new_size=self._image.size,
         rotation=self._rotation,
         to_origin_coordinate=True,
-      ),
-      to_new=RotationAdjuster(
-        origin_size=origin_size,
-        new_size=self._image.size,
-        rotation=self._rotation,
-        to_origin_coordinate=False,
-      ),
-    )
-    adjuster = self._rotation_context.to_new
-
-    for fragment in fragments:
-      rect = fragment.rect
-      fragment.rect = Rectangle(
-        lt=adjuster.adjust(rect.lt),
-        rt=adjuster.adjust(rect.rt),
-        lb=adjuster.adjust(rect.lb),
-        rb=adjuster.adjust(rect.rb),
       )
+      return
+
+    rects = self._to_new.adjust_rectangles([f.rect for f in fragments])
+
+    for fragment, rect in zip(fragments, rects):
+      fragment.rect = rect
+
+  # @return rectangles of fragments in coordinates of image, without modifying fragments.
+  # ordering and matching run in this frame, where fragments and YOLO layouts are upright.
+  def image_rectangles(self, fragments: list[OCRFragment]) -> list[Rectangle]:
+    rects = [f.rect for f in fragments]
+    if self._to_new is not None and not self._adjust_points:
+      rects = self._to_new.adjust_rectangles(rects)
+    return rects
 
   def receive_raw_layouts(self, layouts: list[Layout]):
-    if self._adjust_points or self._rotation_context is None:
+    if self._to_origin is None:
       return
 
-    for fragment, origin_rect in zip(self._fragments, self._rotation_context.fragment_origin_rectangles):
-      fragment.rect = origin_rect
+    rects = self._to_origin.adjust_rectangles([l.rect for l in layouts])
 
-    adjuster = self._rotation_context.to_origin
-
-    for layout in layouts:
-      layout.rect = Rectangle(
-        lt=adjuster.adjust(layout.rect.lt),
-        rt=adjuster.adjust(layout.rect.rt),
-        lb=adjuster.adjust(layout.rect.lb),
-        rb=adjuster.adjust(layout.rect.rb),
-      )
+    for layout, rect in zip(layouts, rects):
+      layout.rect = rect
@@ -1,7 +1,15 @@
-from typing import Generator
+import numpy as np
+
+from typing import Generator, Iterable
 from dataclasses import dataclass
 from shapely.geometry import Polygon
 
+try:
+  from numba import njit, prange
+except ImportError:
+  njit = None
+  prange = range
+
 
 Point = tuple[float, float]
 
@@ -31,4 +39,41 @@ def intersection_area(rect1: Rectangle, rect2: Rectangle) -> float:
   intersection = poly1.intersection(poly2)
   if intersection.is_empty:
     return 0.0
-  return intersection.area
\ No newline at end of file
+  return intersection.area
+
+# @return (N, M) matrix of overlap areas between [left, top, right, bottom] boxes
+def intersection_areas_aabb(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+  widths = np.minimum(boxes1[:, 2:3], boxes2[:, 2]) - np.maximum(boxes1[:, 0:1], boxes2[:, 0])
+  heights = np.minimum(boxes1[:, 3:4], boxes2[:, 3]) - np.maximum(boxes1[:, 1:2], boxes2[:, 1])
+  return np.maximum(widths, 0.0) * np.maximum(heights, 0.0)
+
+# @return index of the box in boxes2 with the largest overlap for each box in boxes1, 0 if none overlaps
+def max_overlap_indexes_aabb(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+  if _max_overlap_indexes_jit is not None:
+    return _max_overlap_indexes_jit(boxes1, boxes2)
+  return intersection_areas_aabb(boxes1, boxes2).argmax(axis=1)
+
+# same result as argmax over intersection_areas_aabb, without allocating the (N, M) matrix
+def _max_overlap_indexes(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+  indexes = np.zeros(boxes1.shape[0], dtype=np.int64)
+  for i in prange(boxes1.shape[0]):
+    max_area = 0.0
+    for j in range(boxes2.shape[0]):
+      width = min(boxes1[i, 2], boxes2[j, 2]) - max(boxes1[i, 0], boxes2[j, 0])
+      height = min(boxes1[i, 3], boxes2[j, 3]) - max(boxes1[i, 1], boxes2[j, 1])
+      if width > 0.0 and height > 0.0 and width * height > max_area:
+        max_area = width * height
+        indexes[i] = j
+  return indexes
+
+_max_overlap_indexes_jit = None
+if njit is not None:
+  _max_overlap_indexes_jit = njit(parallel=True, fastmath=True, cache=True)(_max_overlap_indexes)
+
+# @return (N, 4) array of axis-aligned bounding boxes as [left, top, right, bottom]
+def bounding_boxes(rects: Iterable[Rectangle]) -> np.ndarray:
+  points = np.fromiter(
+    (v for rect in rects for point in rect for v in point),
+    dtype=np.float64,
+  ).reshape(-1, 4, 2)
+  return np.concatenate((points.min(axis=1), points.max(axis=1)), axis=1)
@@ -1,6 +1,8 @@
-from math import pi, atan2, sqrt, sin, cos
+import numpy as np
+
+from math import pi, atan2, sin, cos
 from .types import OCRFragment
-from .rectangle import Point, Rectangle
+from .rectangle import Rectangle
 
 
 class RotationAdjuster:
@@ -21,31 +23,37 @@ class RotationAdjuster:
       to_size = new_size
       rotation = -rotation
 
-    self._rotation: float = rotation
-    self._center_offset: tuple[float, float] = (
-      - from_size[0] / 2.0,
-      - from_size[1] / 2.0,
-    )
-    self._new_offset: tuple[float, float] = (
-      to_size[0] / 2.0,
-      to_size[1] / 2.0,
-    )
-
-  def adjust(self, point: Point) -> Point:
-    x, y = point
-    x += self._center_offset[0]
-    y += self._center_offset[1]
-
-    if x != 0.0 or y != 0.0:
-      radius = sqrt(x*x + y*y)
-      angle = atan2(y, x) + self._rotation
-      x = radius * cos(angle)
-      y = radius * sin(angle)
-
-    x += self._new_offset[0]
-    y += self._new_offset[1]
-
-    return x, y
+    # rotate around the center of from_size, then move to the center of to_size
+    c = cos(rotation)
+    s = sin(rotation)
+    center_x = - from_size[0] / 2.0
+    center_y = - from_size[1] / 2.0
+    offset_x = c * center_x - s * center_y + to_size[0] / 2.0
+    offset_y = s * center_x + c * center_y + to_size[1] / 2.0
+
+    self._matrix: np.ndarray = np.array(((c, -s), (s, c)))
+    self._offset: np.ndarray = np.array((offset_x, offset_y))
+
+  # a point p is adjusted to p @ matrix.T + offset
+  @property
+  def matrix(self) -> np.ndarray:
+    return self._matrix
+
+  @property
+  def offset(self) -> np.ndarray:
+    return self._offset
+
+  def adjust_rectangles(self, rects: list[Rectangle]) -> list[Rectangle]:
+    points = np.array(
+      [(r.lt, r.rt, r.lb, r.rb) for r in rects],
+      dtype=np.float64,
+    ).reshape((-1, 4, 2))
+    points = points @ self.matrix.T + self.offset
+
+    return [
+      Rectangle(lt=tuple(lt), rt=tuple(rt), lb=tuple(lb), rb=tuple(rb))
+      for lt, rt, lb, rb in points.tolist()
+    ]
 
 # to [0, pi)
 def normal_vertical_rotation(rotation: float) -> float: